@@ -0,0 +1,72 @@
+import time
+import threading
+from collections import Counter
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token bucket rate limiter with in-memory state.
+
+    Each client may burst up to `capacity` requests and then gets
+    `refill_rate` new requests per second.
+    """
+
+    def __init__(self, capacity=10, refill_rate=0.5, max_clients=10000):
+        if refill_rate <= 0:
+            # A bucket that never refills would lock clients out for good
+            raise ValueError(f"refill_rate must be positive, got {refill_rate}")
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_clients = max_clients
+        self._buckets = {}  # client -> [tokens, last_refill_time]
+        self._lock = threading.Lock()
+
+    def acquire(self, client):
+        """
+        Takes one token for the client.
+        Returns (allowed, retry_after_seconds).
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._prune(now)
+                bucket = self._buckets[client] = [float(self.capacity), now]
+            else:
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0.0
+            return False, (1 - bucket[0]) / self.refill_rate
+
+    def _prune(self, now):
+        """
+        Drops buckets that have refilled completely; they hold no state worth keeping.
+        If every client is still active, evicts the least recently seen tenth instead.
+        """
+        full_after = self.capacity / self.refill_rate
+        idle = [client for client, (_, last) in self._buckets.items() if now - last >= full_after]
+        if not idle:
+            by_last_seen = sorted(self._buckets, key=lambda client: self._buckets[client][1])
+            idle = by_last_seen[:max(1, len(by_last_seen) // 10)]
+        for client in idle:
+            del self._buckets[client]
+
+
+class AdmissionMetrics:
+    """Thread-safe counters for admission decisions (admitted, rate limited, shed...)."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, decision):
+        with self._lock:
+            self._counts[decision] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,358 @@
+import os
+import re
+import sys
+import random
+import time
+import logging
+import threading
+from collections import deque, namedtuple
+
+import aiml
+from aiml.PatternMgr import PatternMgr
+
+# One record per top-level AIML match (one per input sentence)
+# `flattened` is True when the <srai> chain was resolved by the compiled table
+MatchRecord = namedtuple('MatchRecord', ['input', 'category', 'srai_chain', 'srai_depth', 'flattened', 'elapsed'])
+
+# Template elements whose output depends on the words the wildcards captured
+_STAR_ELEMENTS = {'star', 'thatstar', 'topicstar', 'input', 'that'}
+
+# Longest <srai> chain followed while flattening redirects
+_MAX_FLATTEN_DEPTH = 10
+
+
+def _uses_star(elem):
+    """Returns True if the template element (or any child) reads wildcard/input state."""
+    if not isinstance(elem, list) or not elem:
+        return False
+    if elem[0] in _STAR_ELEMENTS:
+        return True
+    return any(_uses_star(child) for child in elem[2:])
+
+
+def _redirect_target(template):
+    """Returns the <srai> text if the template is a plain redirect, otherwise None."""
+    children = [c for c in template[2:]
+                if not (c[0] == 'text' and c[2].strip() == "")]
+    if len(children) != 1 or children[0][0] != 'srai':
+        return None
+    srai = children[0]
+    if any(part[0] != 'text' for part in srai[2:]):
+        return None
+    target = " ".join("".join(part[2] for part in srai[2:]).split())
+    return target.upper() or None
+
+
+class CompiledPatternMgr(PatternMgr):
+    """
+    PatternMgr with an optional precompiled lookup table.
+
+    compile() flattens redirect-only <srai> chains in place, so every
+    category (wildcards included) whose template just redirects resolves to
+    the final template in one match. It also collects every literal
+    (wildcard-free) category whose match cannot be overridden by a
+    <that>/<topic> condition or an underscore pattern into a dictionary, so
+    those inputs skip the graph walk entirely.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._literal_table = None
+        self._flattened_chains = {}
+        self._replaced_templates = []  # (graph node, original template) undone on invalidate
+        self._pattern_names = None
+        self.match_listener = None
+
+    def add(self, data, template):
+        super().add(data, template)
+        self._invalidate()
+
+    def restore(self, filename):
+        super().restore(filename)
+        self._invalidate()
+
+    def _invalidate(self):
+        if self._literal_table is not None:
+            logging.info("[AIML] Pattern set changed, dropping compiled matcher.")
+        # New categories may change where a redirect lands, so undo the flattening
+        for node, original in self._replaced_templates:
+            node[self._TEMPLATE] = original
+        self._replaced_templates = []
+        self._literal_table = None
+        self._flattened_chains = {}
+        self._pattern_names = None
+
+    def _walk(self, node=None, path=()):
+        """Yields (pattern_path, node) for every graph node holding a template."""
+        if node is None:
+            node = self._root
+        for key, child in node.items():
+            if key == self._TEMPLATE:
+                yield path, node
+            else:
+                yield from self._walk(child, path + (key,))
+
+    def _describe(self, path):
+        """Renders a graph path back into AIML pattern text."""
+        names = {self._UNDERSCORE: "_", self._STAR: "*", self._BOT_NAME: "BOT_NAME",
+                 self._THAT: "| THAT", self._TOPIC: "| TOPIC"}
+        words = [names.get(key, key) for key in path]
+        text = " ".join(words)
+        # Unconditional categories are stored with "that" and "topic" set to "*"
+        return text.replace(" | THAT *", "").replace(" | TOPIC *", "")
+
+    def pattern_name(self, template):
+        """Returns the pattern text of the category owning the template."""
+        if self._pattern_names is None:
+            # Flattened templates are copies stored in place, so they keep their own category name
+            self._pattern_names = {id(node[self._TEMPLATE]): self._describe(p) for p, node in self._walk()}
+        return self._pattern_names.get(id(template), "<unknown>")
+
+    def _unconditional_template(self, that_node):
+        """Returns the template under a THAT node if it only applies to THAT * / TOPIC *."""
+        if set(that_node) != {self._STAR}:
+            return None
+        topic_root = that_node[self._STAR]
+        if set(topic_root) != {self._TOPIC}:
+            return None
+        topic_node = topic_root[self._TOPIC]
+        if set(topic_node) != {self._STAR} or set(topic_node[self._STAR]) != {self._TEMPLATE}:
+            return None
+        return topic_node[self._STAR][self._TEMPLATE]
+
+    def _collect_literals(self, node, words, table):
+        if self._UNDERSCORE in node:
+            # "_" outranks literal words, so nothing below this node is safe to shortcut
+            return
+        if words and self._THAT in node:
+            template = self._unconditional_template(node[self._THAT])
+            if template is not None:
+                table[" ".join(words)] = template
+        for key, child in node.items():
+            if isinstance(key, str):
+                self._collect_literals(child, words + [key], table)
+
+    def _is_unconditional(self, path):
+        """True if the category at path applies for any <that> and <topic>."""
+        if self._THAT not in path:
+            return True
+        that_index = path.index(self._THAT)
+        topic_index = path.index(self._TOPIC)
+        return (path[that_index + 1:topic_index] == (self._STAR,)
+                and path[topic_index + 1:] == (self._STAR,))
+
+    def _resolve_redirects(self, template, lookup):
+        """
+        Follows a redirect-only template through its <srai> chain.
+        Returns (final template, [patterns passed through]) or (None, None) if the
+        chain cannot be resolved statically (loops, no match, or too deep).
+        """
+        resolved = template
+        chain = []
+        seen = {id(template)}
+        for _ in range(_MAX_FLATTEN_DEPTH):
+            target = _redirect_target(resolved)
+            if target is None:
+                return resolved, chain
+            resolved = lookup(target)
+            if resolved is None or id(resolved) in seen:
+                return None, None
+            seen.add(id(resolved))
+            chain.append(self.pattern_name(resolved))
+        return None, None
+
+    def compile(self, normalize=None):
+        """
+        Flattens redirect-only categories and builds the literal lookup table.
+        normalize is the kernel's input substitution, applied to <srai> targets
+        exactly as the interpreter would before matching them.
+        """
+        started = time.perf_counter()
+        self._invalidate()
+        categories = list(self._walk())
+        # Without any <that>/<topic> conditions a redirect target always lands on
+        # the same category, so it can be resolved once here
+        static_targets = all(self._is_unconditional(path) for path, _ in categories)
+
+        literals = {}
+        self._collect_literals(self._root, [], literals)
+
+        def lookup(target):
+            if normalize is not None:
+                target = normalize(target)
+            key = " ".join(re.sub(self._puncStripRE, " ", target.upper()).split())
+            if key in literals:
+                return literals[key]
+            if static_targets:
+                return PatternMgr.match(self, target, "", "")
+            return None
+
+        replacements = []
+        flattened_chains = {}
+        for path, node in categories:
+            resolved, chain = self._resolve_redirects(node[self._TEMPLATE], lookup)
+            # Skip templates reading <star/> & co.: they would see the original input instead
+            if chain and not _uses_star(resolved):
+                flattened = list(resolved)
+                # Remember the redirects skipped so profiling can still report them
+                flattened_chains[id(flattened)] = chain
+                replacements.append((node, flattened))
+
+        for node, flattened in replacements:
+            self._replaced_templates.append((node, node[self._TEMPLATE]))
+            node[self._TEMPLATE] = flattened
+
+        # Re-collect so the literal table points at the flattened templates
+        table = {}
+        self._collect_literals(self._root, [], table)
+
+        self._literal_table = table
+        self._flattened_chains = flattened_chains
+        self._pattern_names = None
+        logging.info(f"[AIML] Compiled {len(table)} literal categories "
+                     f"({len(flattened_chains)} <srai> chains flattened) in "
+                     f"{(time.perf_counter() - started) * 1000:.1f} ms.")
+
+    def match(self, pattern, that, topic):
+        template = None
+        if self._literal_table is not None and pattern:
+            key = " ".join(re.sub(self._puncStripRE, " ", pattern.upper()).split())
+            template = self._literal_table.get(key)
+        if template is None:
+            template = super().match(pattern, that, topic)
+        if self.match_listener is not None and template is not None:
+            self.match_listener(template, self._flattened_chains.get(id(template)))
+        return template
+
+
+class ProfilingKernel(aiml.Kernel):
+    """
+    aiml.Kernel with a precompiled matcher and an optional profiling mode.
+
+    When profiling is enabled every top-level match records the category it
+    hit, the <srai> chain it followed and the wall time it took.
+    """
+
+    def __init__(self, history_size=500):
+        super().__init__()
+        self._brain = CompiledPatternMgr()
+        self._brain.match_listener = self._on_match
+        self.profiling_enabled = False
+        self.recent_matches = deque(maxlen=history_size)
+        self._category_stats = {}
+        self._active_chain = None
+        self._active_flattened = False
+        self._stats_lock = threading.Lock()
+
+    def compile_patterns(self):
+        """Precompiles literal categories and flattens <srai> redirects."""
+        self._brain.compile(normalize=self._subbers['normal'].sub)
+
+    def enable_profiling(self, enabled=True):
+        self.profiling_enabled = enabled
+        logging.info(f"[AIML] Pattern profiling {'enabled' if enabled else 'disabled'}.")
+
+    def reset_profile(self):
+        with self._stats_lock:
+            self.recent_matches.clear()
+            self._category_stats = {}
+
+    def _on_match(self, template, flattened_chain=None):
+        if self._active_chain is not None:
+            self._active_chain.append(self._brain.pattern_name(template))
+            if flattened_chain:
+                self._active_chain.extend(flattened_chain)
+                self._active_flattened = True
+
+    def _respond(self, input_, sessionID):
+        # Nested calls come from <srai>; only the outermost one is timed
+        if not self.profiling_enabled or self._active_chain is not None:
+            return super()._respond(input_, sessionID)
+
+        self._active_chain = []
+        self._active_flattened = False
+        started = time.perf_counter()
+        try:
+            return super()._respond(input_, sessionID)
+        finally:
+            elapsed = time.perf_counter() - started
+            chain = self._active_chain
+            self._active_chain = None
+            self._record(input_, chain, self._active_flattened, elapsed)
+
+    def _record(self, input_, chain, flattened, elapsed):
+        category = chain[0] if chain else "<no match>"
+        record = MatchRecord(input_, category, chain[1:], max(len(chain) - 1, 0), flattened, elapsed)
+        with self._stats_lock:
+            self.recent_matches.append(record)
+            stats = self._category_stats.setdefault(category, {
+                'count': 0, 'total_time': 0.0, 'max_time': 0.0, 'max_srai_depth': 0})
+            stats['count'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['max_srai_depth'] = max(stats['max_srai_depth'], record.srai_depth)
+        depth_note = f"srai depth {record.srai_depth}" + (" flattened" if flattened else "")
+        logging.debug(f"[AIML] '{input_}' -> {category} ({depth_note}, "
+                      f"{elapsed * 1000:.2f} ms)")
+
+    def hotspots(self, limit=10):
+        """Returns the categories that consumed the most match time, slowest first."""
+        with self._stats_lock:
+            ranked = sorted(self._category_stats.items(),
+                            key=lambda item: item[1]['total_time'], reverse=True)
+        return [dict(stats, category=category) for category, stats in ranked[:limit]]
+
+
+def _sample_inputs(brain, filler="SOMETHING"):
+    """Yields one input per unconditional category, with wildcards filled in."""
+    for path, _ in brain._walk():
+        if not brain._is_unconditional(path):
+            continue
+        words = path[:path.index(brain._THAT)] if brain._THAT in path else path
+        yield " ".join(filler if key in (brain._STAR, brain._UNDERSCORE) else key for key in words)
+
+
+def verify_compiled(aiml_path='aiml_files'):
+    """
+    Answers every category's pattern with a plain and a compiled kernel and
+    returns the inputs whose responses differ (an empty list means identical).
+    Loads brain.brn if present, otherwise the .aiml files, like ChatbotCore.
+    """
+    kernels = []
+    for compiled in (False, True):
+        kernel = ProfilingKernel()
+        kernel.verbose(False)
+        brain_file = os.path.join(aiml_path, 'brain.brn')
+        if os.path.exists(brain_file):
+            kernel.loadBrain(brain_file)
+        else:
+            for file in sorted(os.listdir(aiml_path)):
+                if file.endswith('.aiml'):
+                    kernel.learn(os.path.join(aiml_path, file))
+        if compiled:
+            kernel.compile_patterns()
+        kernels.append(kernel)
+
+    plain, compiled = kernels
+    inputs = list(_sample_inputs(plain._brain))
+    mismatches = []
+    for index, user_input in enumerate(inputs):
+        responses = []
+        for kernel in kernels:
+            # <random> templates must pick the same answer on both kernels
+            random.seed(index)
+            responses.append(kernel.respond(user_input))
+        if responses[0] != responses[1]:
+            mismatches.append((user_input, responses[0], responses[1]))
+    logging.info(f"[AIML] Compiled matcher checked on {len(inputs)} inputs, "
+                 f"{len(mismatches)} mismatches.")
+    return mismatches
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    path = sys.argv[1] if len(sys.argv) > 1 else 'aiml_files'
+    differences = verify_compiled(path)
+    for user_input, expected, actual in differences:
+        logging.error(f"[AIML] '{user_input}': plain {expected!r} != compiled {actual!r}")
+    sys.exit(1 if differences else 0)
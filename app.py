@@ -1,13 +1,15 @@
 # app.py
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS 
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import json
 import logging
 from dotenv import load_dotenv
 
 # Import  ChatbotCore
-from chatbot_core import ChatbotCore 
+from chatbot_core import ChatbotCore, FallbackOverloadedError, env_flag
+from admission import TokenBucketLimiter, AdmissionMetrics
 
 # Load environment variables
 load_dotenv()
@@ -16,7 +18,27 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 app = Flask(__name__, static_folder='static') 
-CORS(app) 
+
+# Behind a reverse proxy every request comes from the proxy's address, so
+# rate limiting would lump all clients together. Set TRUSTED_PROXY_HOPS to
+# the number of proxies in front of the app to take the client address from
+# X-Forwarded-For instead. Leave it at 0 when clients connect directly, or
+# they could spoof the header to dodge the limit.
+trusted_proxy_hops = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+if trusted_proxy_hops > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxy_hops)
+cors_origins = os.environ.get("CORS_ORIGINS")
+if not cors_origins:
+    logging.warning("CORS_ORIGINS is not set; accepting cross-origin requests from any site.")
+CORS(app, origins=(cors_origins or "*").split(","))
+
+# --- Admission control for /chat ---
+# Per-client burst of RATE_LIMIT_BURST messages, refilled at RATE_LIMIT_PER_SEC
+rate_limiter = TokenBucketLimiter(
+    capacity=int(os.environ.get("RATE_LIMIT_BURST", 10)),
+    refill_rate=float(os.environ.get("RATE_LIMIT_PER_SEC", 0.5))
+)
+admission_metrics = AdmissionMetrics()
 
 # --- Initialize ChatbotCorewhen the app starts ---
 chatbot = None 
@@ -30,7 +52,13 @@ def initialize_chatbot():
             jkuat_data_path = 'data/jkuat_data.json' 
             gemini_api_key = os.environ.get("myAPiKey")
 
-            chatbot = ChatbotCore(aiml_path=aiml_path)
+            chatbot = ChatbotCore(
+                aiml_path=aiml_path,
+                compile_patterns=env_flag("AIML_COMPILE_PATTERNS"),
+                profile_patterns=env_flag("AIML_PROFILE_PATTERNS"),
+                max_concurrent_fallbacks=int(os.environ.get("MAX_CONCURRENT_FALLBACKS", 4)),
+                max_fallback_wait=float(os.environ.get("MAX_FALLBACK_WAIT", 2.0))
+            )
 
             # Load institution data
             if os.path.exists(jkuat_data_path):
@@ -58,16 +86,42 @@ def chat():
         logging.error("Chatbot not initialized. Cannot process request.")
         return jsonify({"response": "Error: Chatbot is not ready. Please check server logs."}), 500
 
+    allowed, retry_after = rate_limiter.acquire(request.remote_addr)
+    if not allowed:
+        admission_metrics.count("rate_limited")
+        return _too_many_requests("You're sending messages too quickly. Please wait a moment.", retry_after)
+
     user_message = request.json.get('message')
     if not user_message:
+        admission_metrics.count("rejected_empty")
         return jsonify({"response": "No message provided."}), 400
 
     logging.info(f"User: {user_message}")
-    bot_response = chatbot.get_response(user_message)
+    try:
+        bot_response = chatbot.get_response(user_message)
+    except FallbackOverloadedError:
+        admission_metrics.count("shed_overloaded")
+        return _too_many_requests("I'm answering a lot of questions right now. Please try again shortly.", chatbot.max_fallback_wait)
+    admission_metrics.count("admitted")
     logging.info(f"Bot: {bot_response}")
 
     return jsonify({"response": bot_response})
 
+def _too_many_requests(message, retry_after):
+    """Builds a fast 429 response with a Retry-After hint."""
+    response = jsonify({"response": message})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Reports admission-control decision counts and, when profiling is on, AIML pattern hotspots."""
+    report = {"admission": admission_metrics.snapshot()}
+    if chatbot is not None and chatbot.aiml_kernel.profiling_enabled:
+        report["pattern_hotspots"] = chatbot.pattern_hotspots(request.args.get("limit", 10, type=int))
+    return jsonify(report)
+
 if __name__ == '__main__':
     # Ensure the 'data' directory exists
     if not os.path.exists('data'):
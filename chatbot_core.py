@@ -1,13 +1,17 @@
 import nltk
 from nltk.stem import WordNetLemmatizer
 from nltk.corpus import stopwords
-import aiml
 import os
 import json
 import logging
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv 
-import re 
-import google.generativeai as genai 
+from aiml_matcher import ProfilingKernel
+from response_cleaner import ResponseCleaner, clean_gemini_response_text
+from model_backend import GeminiBackend
 
 # environment variables 
 load_dotenv()
@@ -15,67 +19,98 @@ load_dotenv()
 # Configure logging 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Helper function to clean Responses
-def clean_gemini_response_text(text):
-  
-    # Remove bolding (**text**) and italics (*text*)
-    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text) # Removes ** and **
-    text = re.sub(r'\*(.*?)\*', r'\1', text)    # Removes * and * (after bolding removed)
 
-    # Remove markdown list markers 
-    # handles leading whitespace
-    text = re.sub(r'^\s*[-*+]?\s*\d*\.?\s*', '', text, flags=re.MULTILINE)
+def env_flag(name, default=False):
+    """Reads a boolean switch such as AIML_PROFILE_PATTERNS=1 from the environment."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
 
-    # Replace multiple newlines 
-    text = re.sub(r'\n{3,}', '\n\n', text)
 
-    # Strip leading/trailing whitespace 
-    text_lines = [line.strip() for line in text.split('\n')]
-    text = '\n'.join(text_lines).strip()
+class FallbackOverloadedError(Exception):
+    """Raised when no fallback slot frees up within the allowed queue wait."""
 
-    return text
 
+class RequestCancelledError(Exception):
+    """Raised when a caller cancels a request before its fallback call starts."""
 
 
 # Config Gem's
+# Set up lazily on first use, so importing this module (e.g. for offline
+# replays with an injected backend) never touches the network.
 _global_gemini_model = None
-try:
-    api_key = os.environ.get("myAPiKey")
-    if not api_key:
-        raise ValueError("environment variable not set")
-    genai.configure(api_key=api_key)
-    
-    available_models = [
-        m for m in genai.list_models()
-        if 'generateContent' in m.supported_generation_methods and 'gemini-2.0-flash' in m.name
-    ]
-    if available_models:
-        _global_gemini_model = genai.GenerativeModel(available_models[0].name)
-        logging.info("[GLOBAL] API configured successfully ")
-    else:
-        logging.warning("Change Mdel")
-
-except Exception as e:
-    logging.warning(f" Error  global configuration")
-    _global_gemini_model = None
+_global_gemini_configured = False
+_global_gemini_lock = threading.Lock()
+
+
+def get_global_gemini_model():
+    """Returns the shared GeminiBackend, configuring it on first call (None if unavailable)."""
+    global _global_gemini_model, _global_gemini_configured
+    with _global_gemini_lock:
+        if _global_gemini_configured:
+            return _global_gemini_model
+        _global_gemini_configured = True
+        try:
+            api_key = os.environ.get("myAPiKey")
+            if not api_key:
+                raise ValueError("environment variable not set")
+            _global_gemini_model = GeminiBackend.discover(api_key, 'gemini-2.0-flash')
+            if _global_gemini_model:
+                logging.info("[GLOBAL] API configured successfully ")
+            else:
+                logging.warning("Change Mdel")
+        except Exception as e:
+            logging.warning(f" Error  global configuration")
+            _global_gemini_model = None
+        return _global_gemini_model
 
 
 class ChatbotCore:
-    def __init__(self, aiml_path='aiml_files'):
-        self._download_nltk_data()
+    def __init__(self, aiml_path='aiml_files', compile_patterns=False, profile_patterns=False,
+                 max_workers=4, fallback_cache_size=256,
+                 max_concurrent_fallbacks=4, max_fallback_wait=5.0,
+                 model_backend=None, stream_fallback=False, download_nltk_data=True):
+        # Offline runs pass download_nltk_data=False and rely on pre-installed NLTK data
+        if download_nltk_data:
+            self._download_nltk_data()
 
         self.lemmatizer = WordNetLemmatizer()
         self.stop_words = set(stopwords.words('english'))
-        self.aiml_kernel = aiml.Kernel()
+        self.aiml_kernel = ProfilingKernel()
 
         self.aiml_path = aiml_path
         self.institution_data = {} 
         self.institution_name = "the institution" # Default placeholder
 
         self._load_aiml_brain()
+
+        # Optional matcher speed-ups and hotspot profiling (see aiml_matcher.py)
+        if compile_patterns:
+            self.aiml_kernel.compile_patterns()
+        if profile_patterns:
+            self.aiml_kernel.enable_profiling()
         
-        # Link to the globally configured  model
-        self.gemini_model = _global_gemini_model 
+        # Link to the globally configured  model, unless a backend is injected
+        # (any object implementing model_backend.ModelBackend)
+        self.gemini_model = model_backend if model_backend is not None else get_global_gemini_model()
+        self.stream_fallback = stream_fallback
+
+        # Shared worker pool for clients that must not block (GUI, web)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chatbot-worker")
+
+        # Recent fallback answers, keyed by normalised question
+        self._fallback_cache = OrderedDict()
+        self._fallback_cache_size = fallback_cache_size
+        self._fallback_cache_lock = threading.Lock()
+
+        # Global cap on concurrent Gemini calls; callers queue for a slot
+        # for at most max_fallback_wait seconds before being shed
+        self._fallback_slots = threading.BoundedSemaphore(max_concurrent_fallbacks)
+        self.max_fallback_wait = max_fallback_wait
+        # Fallback calls that failed or gave no answer (the user got an error message)
+        self.fallback_errors = 0
+        self._fallback_errors_lock = threading.Lock()
 
     def _download_nltk_data(self):
         """Helper to download necessary NLTK data."""
@@ -231,6 +266,10 @@ class ChatbotCore:
 
         logging.info("[ChatbotCore] Institution predicates set.")
 
+    def pattern_hotspots(self, limit=10):
+        """Returns the AIML categories that used the most match time (profiling mode only)."""
+        return self.aiml_kernel.hotspots(limit)
+
     def preprocess_text(self, text):
         """Converts text to uppercase, removes stop words, and lemmatizes."""
         text = text.upper()
@@ -244,8 +283,12 @@ class ChatbotCore:
                     filtered_words.append(lemmatized_word)
         return " ".join(filtered_words)
 
-    def get_response(self, user_input):
-        """Gets a response from the chatbot based on user input."""
+    def get_response(self, user_input, cancel_event=None):
+        """
+        Gets a response from the chatbot based on user input.
+        If cancel_event (a threading.Event) is set before the Gemini fallback
+        starts, RequestCancelledError is raised instead of calling Gemini.
+        """
         # Process user input for AIML matching
         processed_input = self.preprocess_text(user_input)
         logging.debug(f"Processed input for AIML: '{processed_input}'")
@@ -256,30 +299,105 @@ class ChatbotCore:
         # fallback plan
         if not response or response.strip() == "":
             logging.info("Consulting ...")
-            if self.gemini_model:
-                try:
-                    gemini_prompt = (
-                        f"You are the official JKUAT School Chatbot. Your purpose is to assist students "
-                        f"by providing concise, factual information about JKUAT. "
-                        f"Always use available information. Avoid stating 'I don't know'.\n\n" 
-                        f"Provide a direct, concise answer to the following question. "
-                        f"If a list or explanation is requested, limit it to under 100 words. "
-                        f"Question: {user_input}"
-                        )    
-                    gemini_raw_response_obj = self.gemini_model.generate_content(gemini_prompt) # Use the new prompt
-                    
-                    if hasattr(gemini_raw_response_obj, 'text') and gemini_raw_response_obj.text:
-                        response_text = gemini_raw_response_obj.text
-                        # --- APPLY THE CLEANING FUNCTION HERE! ---
-                        response = clean_gemini_response_text(response_text)
-                        logging.info("[ChatbotCore] Got it.")
-                    else:
-                        logging.warning("[ChatbotCore] Not Response.")
-                        response = "I couldn't process at the moment"
-                except Exception as e:
-                    logging.error(f"[ChatbotCore] ERROR calling Assistant: {e}")
-                    response = "I'm sorry, I couldn't get an answer at the moment"
-            else:
-                response = f"I'm sorry, I don't have information on that about {self.institution_name},Can you try asking about something else related to {self.institution_name}?"
-
-        return response
\ No newline at end of file
+            response = self._get_fallback_response(user_input, cancel_event)
+
+        return response
+
+    def get_response_async(self, user_input, cancel_event=None):
+        """Queues get_response on the shared worker pool and returns a Future."""
+        return self._executor.submit(self.get_response, user_input, cancel_event)
+
+    def _check_cancelled(self, cancel_event):
+        if cancel_event is not None and cancel_event.is_set():
+            logging.info("[ChatbotCore] Request cancelled before calling Assistant.")
+            raise RequestCancelledError("Request was superseded.")
+
+    def _acquire_fallback_slot(self, cancel_event):
+        """Waits up to max_fallback_wait for a fallback slot, giving up early if cancelled."""
+        deadline = time.monotonic() + self.max_fallback_wait
+        while True:
+            self._check_cancelled(cancel_event)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Wake up regularly so a cancelled request stops waiting promptly
+            if self._fallback_slots.acquire(timeout=min(remaining, 0.1)):
+                return True
+
+    def _get_fallback_response(self, user_input, cancel_event=None):
+        """Answers an unmatched question with Gemini, reusing recent answers."""
+        if not self.gemini_model:
+            return f"I'm sorry, I don't have information on that about {self.institution_name},Can you try asking about something else related to {self.institution_name}?"
+
+        cache_key = " ".join(user_input.lower().split())
+        with self._fallback_cache_lock:
+            if cache_key in self._fallback_cache:
+                self._fallback_cache.move_to_end(cache_key)
+                logging.info("[ChatbotCore] Answered from fallback cache.")
+                return self._fallback_cache[cache_key]
+
+        self._check_cancelled(cancel_event)
+        if not self._acquire_fallback_slot(cancel_event):
+            logging.warning(f"[ChatbotCore] No fallback slot free after {self.max_fallback_wait}s, shedding request.")
+            raise FallbackOverloadedError("Too many questions are being answered right now.")
+        try:
+            self._check_cancelled(cancel_event)
+            response = self._call_gemini(user_input)
+        except RequestCancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"[ChatbotCore] ERROR calling Assistant: {e}")
+            self._count_fallback_error()
+            return "I'm sorry, I couldn't get an answer at the moment"
+        finally:
+            self._fallback_slots.release()
+        if response is None:
+            self._count_fallback_error()
+            return "I couldn't process at the moment"
+
+        # Only successful answers are cached, so errors are retried next time
+        with self._fallback_cache_lock:
+            self._fallback_cache[cache_key] = response
+            while len(self._fallback_cache) > self._fallback_cache_size:
+                self._fallback_cache.popitem(last=False)
+        return response
+
+    def _count_fallback_error(self):
+        with self._fallback_errors_lock:
+            self.fallback_errors += 1
+
+    def _call_gemini(self, user_input):
+        """Sends the fallback prompt to Gemini; returns cleaned text or None if it gave none."""
+        gemini_prompt = (
+            f"You are the official JKUAT School Chatbot. Your purpose is to assist students "
+            f"by providing concise, factual information about JKUAT. "
+            f"Always use available information. Avoid stating 'I don't know'.\n\n" 
+            f"Provide a direct, concise answer to the following question. "
+            f"If a list or explanation is requested, limit it to under 100 words. "
+            f"Question: {user_input}"
+            )    
+        if self.stream_fallback:
+            # Clean chunks as they arrive instead of after the whole answer
+            cleaner = ResponseCleaner()
+            parts = [cleaner.feed(chunk.text) for chunk in self.gemini_model.generate_content(gemini_prompt, stream=True)]
+            parts.append(cleaner.close())
+            response = "".join(parts)
+            if response:
+                logging.info("[ChatbotCore] Got it.")
+                return response
+            logging.warning("[ChatbotCore] Not Response.")
+            return None
+
+        gemini_raw_response_obj = self.gemini_model.generate_content(gemini_prompt) # Use the new prompt
+
+        if hasattr(gemini_raw_response_obj, 'text') and gemini_raw_response_obj.text:
+            response_text = gemini_raw_response_obj.text
+            # --- APPLY THE CLEANING FUNCTION HERE! ---
+            logging.info("[ChatbotCore] Got it.")
+            return clean_gemini_response_text(response_text)
+        logging.warning("[ChatbotCore] Not Response.")
+        return None
+
+    def shutdown(self, wait=False):
+        """Stops the worker pool, dropping requests that have not started yet."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,32 +1,146 @@
-import google.generativeai as genai
 import json
 import os
 import logging
 from dotenv import load_dotenv
 import time
+from model_backend import GeminiBackend
 
 # Load environment variables from .env file
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Define your generic JSON schema for university data
+# THIS SCHEMA IS CRITICAL. ADJUST IT TO PERFECTLY MATCH THE DATA YOU WANT TO EXTRACT.
+UNIVERSITY_DATA_SCHEMA = {
+    "institute_name": "string",
+    "university_overview": {
+        "motto": "string | null",
+        "vision": "string | null",
+        "mission": "string | null",
+        "general_overview": "string | null",
+        "location": {
+            "city": "string | null",
+            "county": "string | null",
+            "country": "string | null",
+            "coordinates": "string | null"
+        },
+        "vice_chancellor": {
+            "name": "string | null"
+        },
+        "establishment_year": "string | null",
+        "type": "string | null"
+    },
+    "admissions_general": {
+        "undergraduate_programs": {
+            "general_requirements": {
+                "kenyan_students": {
+                    "kcse_minimum": "string | null",
+                    "diploma_entry_requirements": "string | null"
+                },
+                "international_students": {
+                    "equivalent_qualifications": "string | null"
+                }
+            },
+            "application_process": {
+                "required_documents": "list of strings | null",
+                "application_portal_link": "string | null",
+                "application_deadlines": "string | null"
+            }
+        },
+        "postgraduate_programs": {
+            "general_requirements": "string | null"
+        }
+    },
+    "fees_information": {
+        "tuition_and_fees": {
+            "general_information": "string | null",
+            "common_fee_structures": {
+                "government_sponsored_students": {
+                    "approximate_fee_range_per_year_kes": "string | null"
+                },
+                "self_sponsored_students": {
+                    "approximate_fee_range_per_year_kes": "string | null"
+                },
+                "international_students": {
+                    "approximate_fee_range_per_year_usd": "string | null"
+                }
+            }
+        }
+    },
+    "contact_details": {
+        "main_contact_information": {
+            "general_enquiries": {
+                "phone_numbers": "list of strings | null",
+                "email": "string | null"
+            },
+            "admissions_office": {
+                "phone_numbers": "list of strings | null",
+                "email": "string | null"
+            },
+            "physical_address": "string | null"
+        }
+    },
+    "admission_faqs": [
+        {
+            "question": "string",
+            "answer": "string"
+        }
+    ],
+    "courses_offered": [
+        {
+            "course_name": "string",
+            "degree_level": "string | null",
+            "duration": "string | null",
+            "fees_kes": "string | null",
+            "entry_requirements": "string | null",
+            "department": "string | null"
+        }
+    ],
+    "campus_facilities": {
+        "libraries": "string | null",
+        "hostels_accommodation": "string | null",
+        "sports_facilities": "string | null",
+        "health_services": "string | null"
+    },
+    "student_life": {
+        "clubs_societies": "string | null",
+        "events_traditions": "string | null"
+    },
+    "research_innovation": {
+        "key_research_areas": "list of strings | null",
+        "research_centers": "list of strings | null",
+        "publications_highlights": "string | null"
+    },
+    "alumni_relations": {
+        "alumni_association_info": "string | null"
+    },
+    "rankings_accreditations": {
+        "national_rankings": "string | null",
+        "international_rankings": "string | null",
+        "accrediting_bodies": "list of strings | null"
+    }
+}
+
+
 def configure_gemini():
     
     try:
         api_key = os.environ.get("myAPiKey")
         if not api_key:
             raise ValueError("Key error in env")
-        genai.configure(api_key=api_key)
+        backend = GeminiBackend('gemini-2.0-flash', api_key=api_key)
         logging.info("Config success.")
-        return genai.GenerativeModel('gemini-2.0-flash')
+        return backend
     except Exception as e:
         logging.error(f"Error config {e}")
         return None
 
-def generate_info_with_gemini(institute_name, gemini_model, data_schema, additional_context=None):
+def generate_info_with_gemini(institute_name, gemini_model, data_schema, additional_context=None, retry_delay=2):
     """
     Generate structured data about an institution subject to 
      the provided schema.
+    gemini_model can be any model_backend.ModelBackend (e.g. a fake for replay tests).
     """
     if not gemini_model:
         logging.error("Cannot generate information.")
@@ -68,6 +182,7 @@ def generate_info_with_gemini(institute_name, gemini_model, data_schema, additio
     try:
         retries = 3
         for attempt in range(retries):
+            response = None
             try:
                 response = gemini_model.generate_content(prompt)
                 json_str = response.text.strip()
@@ -84,12 +199,12 @@ def generate_info_with_gemini(institute_name, gemini_model, data_schema, additio
             except json.JSONDecodeError as e:
                 logging.error(f"Attempt {attempt+1}: Error decoding JSON for '{institute_name}': {e}")
                 logging.error(f"Raw Gem data: \n{json_str[:500]}...")
-                time.sleep(2)
+                time.sleep(retry_delay)
             except Exception as e:
                 logging.error(f"Attempt {attempt+1}: Error in call for '{institute_name}': {e}")
                 if response and hasattr(response, 'text'):
                     logging.error(f"Raw response: {response.text[:500]}...")
-                time.sleep(2)
+                time.sleep(retry_delay)
         logging.error(f"Failed to generate data for '{institute_name}' after {retries} attempts.")
         return None
 
@@ -102,118 +217,6 @@ def main():
     if not gemini_model:
         return
 
-    # Define your generic JSON schema for university data
-    # THIS SCHEMA IS CRITICAL. ADJUST IT TO PERFECTLY MATCH THE DATA YOU WANT TO EXTRACT.
-    university_data_schema = {
-        "institute_name": "string",
-        "university_overview": {
-            "motto": "string | null",
-            "vision": "string | null",
-            "mission": "string | null",
-            "general_overview": "string | null",
-            "location": {
-                "city": "string | null",
-                "county": "string | null",
-                "country": "string | null",
-                "coordinates": "string | null"
-            },
-            "vice_chancellor": {
-                "name": "string | null"
-            },
-            "establishment_year": "string | null",
-            "type": "string | null"
-        },
-        "admissions_general": {
-            "undergraduate_programs": {
-                "general_requirements": {
-                    "kenyan_students": {
-                        "kcse_minimum": "string | null",
-                        "diploma_entry_requirements": "string | null"
-                    },
-                    "international_students": {
-                        "equivalent_qualifications": "string | null"
-                    }
-                },
-                "application_process": {
-                    "required_documents": "list of strings | null",
-                    "application_portal_link": "string | null",
-                    "application_deadlines": "string | null"
-                }
-            },
-            "postgraduate_programs": {
-                "general_requirements": "string | null"
-            }
-        },
-        "fees_information": {
-            "tuition_and_fees": {
-                "general_information": "string | null",
-                "common_fee_structures": {
-                    "government_sponsored_students": {
-                        "approximate_fee_range_per_year_kes": "string | null"
-                    },
-                    "self_sponsored_students": {
-                        "approximate_fee_range_per_year_kes": "string | null"
-                    },
-                    "international_students": {
-                        "approximate_fee_range_per_year_usd": "string | null"
-                    }
-                }
-            }
-        },
-        "contact_details": {
-            "main_contact_information": {
-                "general_enquiries": {
-                    "phone_numbers": "list of strings | null",
-                    "email": "string | null"
-                },
-                "admissions_office": {
-                    "phone_numbers": "list of strings | null",
-                    "email": "string | null"
-                },
-                "physical_address": "string | null"
-            }
-        },
-        "admission_faqs": [
-            {
-                "question": "string",
-                "answer": "string"
-            }
-        ],
-        "courses_offered": [
-            {
-                "course_name": "string",
-                "degree_level": "string | null",
-                "duration": "string | null",
-                "fees_kes": "string | null",
-                "entry_requirements": "string | null",
-                "department": "string | null"
-            }
-        ],
-        "campus_facilities": {
-            "libraries": "string | null",
-            "hostels_accommodation": "string | null",
-            "sports_facilities": "string | null",
-            "health_services": "string | null"
-        },
-        "student_life": {
-            "clubs_societies": "string | null",
-            "events_traditions": "string | null"
-        },
-        "research_innovation": {
-            "key_research_areas": "list of strings | null",
-            "research_centers": "list of strings | null",
-            "publications_highlights": "string | null"
-        },
-        "alumni_relations": {
-            "alumni_association_info": "string | null"
-        },
-        "rankings_accreditations": {
-            "national_rankings": "string | null",
-            "international_rankings": "string | null",
-            "accrediting_bodies": "list of strings | null"
-        }
-    }
-
     # --- Configuration for Institutions to Generate Data For ---
     institute_configs = {
         "JKUAT": {
@@ -237,7 +240,7 @@ def main():
         
         logging.info(f"\n--- Generating data for {institute_name} ---")
         
-        extracted_data = generate_info_with_gemini(institute_name, gemini_model, university_data_schema, additional_context)
+        extracted_data = generate_info_with_gemini(institute_name, gemini_model, UNIVERSITY_DATA_SCHEMA, additional_context)
 
         if extracted_data:
             # Add the institute name to the extracted data at the top level
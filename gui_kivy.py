@@ -3,19 +3,60 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
-from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.core.window import Window
-from kivy.clock import mainthread
-import threading
+from kivy.clock import Clock, mainthread
+from kivy.properties import StringProperty
+from collections import deque
 import logging
+import threading
+from chatbot_core import FallbackOverloadedError, RequestCancelledError
 
 # Config logging for Kivy messages
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Rows kept in the rendered history; older messages are moved to the archive
+HISTORY_WINDOW = 200
+# Archived messages buffered in memory; when full they are flushed to the
+# transcript file (if one is configured) or the oldest are dropped
+ARCHIVE_LIMIT = 1000
+# Seconds to wait for an answer before giving the input back to the user
+RESPONSE_TIMEOUT = 20
+# Typing "/export [file]" saves the whole session instead of asking the bot
+EXPORT_COMMAND = "/export"
+DEFAULT_EXPORT_PATH = "chat_history.txt"
+
+
+class ChatMessageRow(Label):
+    """One chat message, recycled by the history RecycleView."""
+    sender = StringProperty('')
+    message = StringProperty('')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.markup = True
+        self.halign = 'left'
+        self.valign = 'top'
+        self.size_hint_y = None
+        # Wrap to the row width and grow the row to fit the wrapped text
+        self.bind(width=lambda row, width: setattr(row, 'text_size', (width, None)))
+        self.bind(texture_size=lambda row, size: setattr(row, 'height', size[1]))
+
+
 class ChatbotApp(App):
-    def __init__(self, chatbot_core_instance, **kwargs):
+    def __init__(self, chatbot_core_instance, history_window=HISTORY_WINDOW, archive_limit=ARCHIVE_LIMIT,
+                 transcript_path=None, **kwargs):
         super().__init__(**kwargs)
         self.bot = chatbot_core_instance
+        self.history_window = history_window
+        # Plain-text copies of messages that scrolled out of the rendered window
+        self.archived_messages = deque(maxlen=archive_limit)
+        self.transcript_path = transcript_path
+        # Only the latest request may update the GUI; older ones are superseded
+        self._pending_request = None
+        self._request_counter = 0
+        self._timeout_event = None
         self.title = f"Amanda: Smart Enquiry Chatbot for {self.bot.institution_name}"
 
     def build(self):
@@ -25,13 +66,20 @@ class ChatbotApp(App):
         # Main layout
         self.main_layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
 
-        # Chat history display
-        self.history_label = Label(text="", size_hint_y=None, valign='top', markup=True)
-        self.history_label.bind(texture_size=self.history_label.setter('size')) # Automatically adjust height
-
-        self.scroll_view = ScrollView(size_hint=(1, 0.85)) 
-        self.scroll_view.add_widget(self.history_label)
-        self.main_layout.add_widget(self.scroll_view)
+        # Chat history display: only rows in view are instantiated, so adding
+        # a message costs the same no matter how long the session has run
+        self.history_view = RecycleView(size_hint=(1, 0.85))
+        self.history_view.viewclass = ChatMessageRow
+        history_layout = RecycleBoxLayout(
+            orientation='vertical',
+            size_hint_y=None,
+            default_size_hint=(1, None),
+            default_size=(None, 30),
+            spacing=4
+        )
+        history_layout.bind(minimum_height=history_layout.setter('height'))
+        self.history_view.add_widget(history_layout)
+        self.main_layout.add_widget(self.history_view)
 
         # Input box
         self.input_box = TextInput(
@@ -70,10 +118,23 @@ class ChatbotApp(App):
     def add_message(self, sender, message, color='#000000'): # Default black for user
         """Adds a message to the chat history."""
         # Use markup for coloring sender
-        new_text = f"[b][color={color}]{sender}[/color][/b]: {message}\n"
-        self.history_label.text += new_text
-        # Scroll to bottom after adding message
-        self.scroll_view.scroll_y = 0
+        new_text = f"[b][color={color}]{sender}[/color][/b]: {message}"
+        rows = self.history_view.data
+        rows.append({'text': new_text, 'sender': sender, 'message': message})
+
+        # Keep the rendered window bounded; archive the oldest rows
+        overflow = len(rows) - self.history_window
+        if overflow > 0:
+            if len(self.archived_messages) + overflow > self.archived_messages.maxlen:
+                self._flush_archive()
+            self.archived_messages.extend(f"{row['sender']}: {row['message']}" for row in rows[:overflow])
+            del rows[:overflow]
+
+        # Scroll to bottom once the layout has picked up the new row
+        Clock.schedule_once(self._scroll_to_bottom)
+
+    def _scroll_to_bottom(self, *args):
+        self.history_view.scroll_y = 0
 
     def send_message(self, instance):
         """Handles sending a user message."""
@@ -81,32 +142,131 @@ class ChatbotApp(App):
         if not user_text:
             return
 
+        if user_text.split()[0] == EXPORT_COMMAND:
+            self.input_box.text = ""
+            filepath = user_text[len(EXPORT_COMMAND):].strip() or DEFAULT_EXPORT_PATH
+            if self.export_history(filepath):
+                self.add_message("Amanda", f"Chat history saved to {filepath}.", color='#0000FF')
+            else:
+                self.add_message("Amanda", f"I couldn't save the chat history to {filepath}.", color='#0000FF')
+            return
+
         self.add_message("You", user_text, color='#008000') # Green for user
         self.input_box.text = "" # Clear input box
 
+        # Supersede any request still waiting for an answer
+        self._cancel_pending_request()
+
         # Disable input while processing
-        self.input_box.disabled = True
-        self.send_button.disabled = True
-        self.send_button.text = "Thinking..."
+        self._set_input_enabled(False)
 
-        # Run chatbot response in a separate thread to avoid freezing GUI
-        threading.Thread(target=self._get_bot_response_thread, args=(user_text,)).start()
+        # Queue the request on the chatbot's shared worker pool
+        self._request_counter += 1
+        request_id = self._request_counter
+        # Setting the event stops the request before it takes a Gemini slot
+        cancel_event = threading.Event()
+        future = self.bot.get_response_async(user_text, cancel_event)
+        self._pending_request = (request_id, future, cancel_event)
+        future.add_done_callback(lambda done: self._on_bot_response(request_id, done))
 
-    @mainthread
-    def _update_gui_with_bot_response(self, bot_response):
-        """Updates the GUI with the bot's response."""
-        self.add_message("Amanda", bot_response, color='#0000FF') # Blue for bot
-        self.input_box.disabled = False
-        self.send_button.disabled = False
-        self.send_button.text = "Send"
-        self.input_box.focus = True # Put focus back on input box
+        # Give the input back if the answer takes too long
+        self._timeout_event = Clock.schedule_once(lambda dt: self._on_response_timeout(request_id), RESPONSE_TIMEOUT)
 
-    def _get_bot_response_thread(self, user_text):
-        """Worker thread to get bot response."""
+    def _set_input_enabled(self, enabled):
+        self.input_box.disabled = not enabled
+        self.send_button.disabled = not enabled
+        self.send_button.text = "Send" if enabled else "Thinking..."
+        if enabled:
+            self.input_box.focus = True # Put focus back on input box
+
+    def _cancel_pending_request(self):
+        """Drops the current request; its answer is discarded if it still arrives."""
+        if self._timeout_event is not None:
+            self._timeout_event.cancel()
+            self._timeout_event = None
+        if self._pending_request is not None:
+            request_id, future, cancel_event = self._pending_request
+            cancel_event.set()
+            if future.cancel():
+                logging.info(f"Cancelled superseded request #{request_id} before it started.")
+            self._pending_request = None
+
+    def _on_response_timeout(self, request_id):
+        """Re-enables input when the current request runs past RESPONSE_TIMEOUT."""
+        if self._pending_request is None or self._pending_request[0] != request_id:
+            return
+        self._timeout_event = None
+        logging.warning(f"Request #{request_id} timed out after {RESPONSE_TIMEOUT}s.")
+        self.add_message("Amanda", "This is taking longer than expected. You can keep waiting or ask something else.", color='#0000FF')
+        self._set_input_enabled(True)
+
+    def _on_bot_response(self, request_id, future):
+        """Worker-side callback; unpacks the Future and hands the answer to the GUI."""
+        if future.cancelled():
+            return
         try:
-            bot_response = self.bot.get_response(user_text)
+            bot_response = future.result()
+        except RequestCancelledError:
+            return
+        except FallbackOverloadedError:
+            bot_response = "I'm answering a lot of questions right now. Please try again shortly."
         except Exception as e:
             logging.error(f"Error getting bot response: {e}")
             bot_response = "I encountered an error trying to process your request."
-        finally:
-            self._update_gui_with_bot_response(bot_response)
\ No newline at end of file
+        self._update_gui_with_bot_response(request_id, bot_response)
+
+    @mainthread
+    def _update_gui_with_bot_response(self, request_id, bot_response):
+        """Updates the GUI with the bot's response."""
+        if self._pending_request is None or self._pending_request[0] != request_id:
+            logging.info(f"Discarding answer to superseded request #{request_id}.")
+            return
+        self._pending_request = None
+        if self._timeout_event is not None:
+            self._timeout_event.cancel()
+            self._timeout_event = None
+        self.add_message("Amanda", bot_response, color='#0000FF') # Blue for bot
+        self._set_input_enabled(True)
+
+    def _append_transcript(self, lines):
+        """Appends lines to the transcript file, if one is configured."""
+        if not self.transcript_path:
+            return
+        try:
+            with open(self.transcript_path, 'a', encoding='utf-8') as f:
+                f.writelines(line + "\n" for line in lines)
+        except OSError as e:
+            logging.error(f"Error writing chat transcript to {self.transcript_path}: {e}")
+
+    def _flush_archive(self):
+        """Moves archived messages to the transcript file; without one the oldest are dropped."""
+        if not self.transcript_path:
+            logging.debug("No chat transcript configured; the oldest archived messages will be dropped.")
+            return
+        try:
+            with open(self.transcript_path, 'a', encoding='utf-8') as f:
+                # Remove each line once written, so a failure part way never writes it twice
+                while self.archived_messages:
+                    f.write(self.archived_messages[0] + "\n")
+                    self.archived_messages.popleft()
+        except OSError as e:
+            logging.error(f"Error writing chat transcript to {self.transcript_path}: {e}")
+
+    def export_history(self, filepath):
+        """Writes the archived and currently shown messages to filepath; returns False on failure."""
+        visible = [f"{row['sender']}: {row['message']}" for row in self.history_view.data]
+        try:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.writelines(line + "\n" for line in list(self.archived_messages) + visible)
+        except OSError as e:
+            logging.error(f"Error exporting chat history to {filepath}: {e}")
+            return False
+        logging.info(f"Chat history exported to {filepath}")
+        return True
+
+    def on_stop(self):
+        self._cancel_pending_request()
+        # Keep the tail of the session in the transcript as well
+        if self.transcript_path:
+            self._flush_archive()
+            self._append_transcript(f"{row['sender']}: {row['message']}" for row in self.history_view.data)
@@ -1,7 +1,7 @@
 import os
 import json
 import logging
-from chatbot_core import ChatbotCore
+from chatbot_core import ChatbotCore, env_flag
 from gui_kivy import ChatbotApp
 
 # Configure logging for the main script
@@ -36,7 +36,11 @@ if __name__ == "__main__":
     os.makedirs(DATA_DIR, exist_ok=True)
 
     # Initialize chatbot core
-    chatbot_instance = ChatbotCore(aiml_path=AIML_PATH)
+    chatbot_instance = ChatbotCore(
+        aiml_path=AIML_PATH,
+        compile_patterns=env_flag("AIML_COMPILE_PATTERNS"),
+        profile_patterns=env_flag("AIML_PROFILE_PATTERNS")
+    )
 
     # --- Load specific institution data ---
     #  Hardcoding JKUAT for the initial load
@@ -56,5 +60,14 @@ if __name__ == "__main__":
         exit("Chatbot cannot start without institution data.")
 
     # Run the Kivy GUI application
-    ChatbotApp(chatbot_core_instance=chatbot_instance).run()
+    # CHAT_TRANSCRIPT_PATH keeps messages that scroll out of the GUI history on disk
+    ChatbotApp(chatbot_core_instance=chatbot_instance,
+               transcript_path=os.environ.get("CHAT_TRANSCRIPT_PATH")).run()
+    chatbot_instance.shutdown()
+
+    # Report the slowest AIML patterns of the session when profiling is on
+    if chatbot_instance.aiml_kernel.profiling_enabled:
+        for hotspot in chatbot_instance.pattern_hotspots():
+            logging.info(f"[AIML hotspot] {hotspot['category']}: {hotspot['count']} matches, "
+                         f"{hotspot['total_time'] * 1000:.1f} ms total, max srai depth {hotspot['max_srai_depth']}")
     logging.info("--- Amanda Chatbot Application Exited ---")
\ No newline at end of file
@@ -0,0 +1,120 @@
+import json
+import time
+import random
+import logging
+from abc import ABC, abstractmethod
+
+
+class ModelResponse:
+    """Minimal stand-in for a Gemini response (or one streamed chunk of it)."""
+    def __init__(self, text):
+        self.text = text
+
+
+class ModelBackend(ABC):
+    """
+    Interface the chatbot and data extractor expect from an LLM.
+
+    generate_content(prompt) returns an object with a `.text` attribute;
+    with stream=True it returns an iterable of such objects, one per chunk.
+    google.generativeai.GenerativeModel already satisfies this, so it can be
+    passed anywhere a backend is accepted, but the app wraps it in
+    GeminiBackend so every model goes through this interface.
+    """
+    @abstractmethod
+    def generate_content(self, prompt, stream=False):
+        """Returns a response with `.text`, or an iterable of chunks when stream=True."""
+
+
+class GeminiBackend(ModelBackend):
+    """Thin wrapper around google.generativeai.GenerativeModel."""
+    def __init__(self, model_name='gemini-2.0-flash', api_key=None):
+        # Imported here so offline replays don't need the Gemini client installed
+        import google.generativeai as genai
+        if api_key:
+            genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    @classmethod
+    def discover(cls, api_key, name_hint):
+        """Configures the API key and wraps the first available model whose name contains name_hint."""
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        available_models = [
+            m for m in genai.list_models()
+            if 'generateContent' in m.supported_generation_methods and name_hint in m.name
+        ]
+        if not available_models:
+            return None
+        return cls(available_models[0].name)
+
+    def generate_content(self, prompt, stream=False):
+        return self._model.generate_content(prompt, stream=stream)
+
+
+class FakeBackendError(Exception):
+    """Injected failure raised by FakeModelBackend."""
+
+
+class FakeModelBackend(ModelBackend):
+    """
+    Deterministic offline backend for replay and performance tests.
+
+    Answers come from `responses`, a dict of {prompt substring: answer text};
+    the first key (in insertion order) found in the prompt wins, otherwise `default_response` is
+    used. Latency is `delay` seconds per call plus `chunk_delay` per streamed
+    chunk. By default latency is only simulated (added to `simulated_time`)
+    so replays are fast and repeatable; pass real_time=True to actually sleep.
+    Failures are injected with probability `error_rate` from a seeded RNG.
+    """
+    def __init__(self, responses=None, default_response="", delay=0.0, chunk_delay=0.0,
+                 chunk_size=40, error_rate=0.0, seed=0, real_time=False):
+        self.responses = responses or {}
+        self.default_response = default_response
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.error_rate = error_rate
+        self.real_time = real_time
+        self._rng = random.Random(seed)
+        self.simulated_time = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    @classmethod
+    def from_file(cls, filepath, **kwargs):
+        """Loads recorded responses from a JSON file ({"responses": {...}, "default_response": "..."})."""
+        with open(filepath, 'r', encoding='utf-8') as f:
+            recorded = json.load(f)
+        kwargs.setdefault('default_response', recorded.get('default_response', ""))
+        return cls(responses=recorded.get('responses', {}), **kwargs)
+
+    def _wait(self, seconds):
+        self.simulated_time += seconds
+        if self.real_time and seconds > 0:
+            time.sleep(seconds)
+
+    def _lookup(self, prompt):
+        for key, answer in self.responses.items():
+            if key in prompt:
+                return answer
+        return self.default_response
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        self._wait(self.delay)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.failures += 1
+            logging.debug(f"[FakeModelBackend] Injected failure on call {self.calls}.")
+            raise FakeBackendError(f"Injected failure on call {self.calls}")
+
+        text = self._lookup(prompt)
+        if not stream:
+            return ModelResponse(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        for start in range(0, len(text), self.chunk_size):
+            self._wait(self.chunk_delay)
+            yield ModelResponse(text[start:start + self.chunk_size])
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+from model_backend import FakeModelBackend
+from data_extractor import generate_info_with_gemini, UNIVERSITY_DATA_SCHEMA
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Replay settings for the fake backend; keep them fixed so runs are comparable
+REPLAY_SETTINGS = {
+    "delay": 0.8,         # seconds of simulated model latency per call
+    "chunk_delay": 0.05,  # extra seconds per streamed chunk
+    "chunk_size": 40,
+    "error_rate": 0.1,
+    "seed": 42,
+}
+
+# Deterministic report fields checked against a baseline, and which way is worse
+REGRESSION_CHECKS = {
+    "simulated_p50_ms": "higher",
+    "simulated_p95_ms": "higher",
+    "simulated_max_ms": "higher",
+    "simulated_throughput_rps": "lower",
+    "model_calls": "higher",
+    "succeeded": "lower",
+    "fallback_errors": "higher",
+}
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, simulated_latencies, wall_latencies):
+    """
+    Builds a latency/throughput report for one replay.
+    Simulated figures come from the fake backend and are deterministic;
+    wall figures measure our own processing and vary slightly between runs.
+    """
+    simulated_total = sum(simulated_latencies)
+    report = {
+        "name": name,
+        "requests": len(simulated_latencies),
+        "simulated_p50_ms": _percentile(simulated_latencies, 0.5) * 1000,
+        "simulated_p95_ms": _percentile(simulated_latencies, 0.95) * 1000,
+        "simulated_max_ms": max(simulated_latencies, default=0.0) * 1000,
+        "simulated_throughput_rps": len(simulated_latencies) / simulated_total if simulated_total else float("inf"),
+        "wall_p50_ms": _percentile(wall_latencies, 0.5) * 1000,
+        "wall_p95_ms": _percentile(wall_latencies, 0.95) * 1000,
+    }
+    logging.info(f"[Replay] {name}: {report['requests']} requests, "
+                 f"simulated p50 {report['simulated_p50_ms']:.1f} ms / p95 {report['simulated_p95_ms']:.1f} ms, "
+                 f"{report['simulated_throughput_rps']:.2f} req/s; "
+                 f"wall p95 {report['wall_p95_ms']:.2f} ms")
+    return report
+
+
+def _timed(backend, func, *args, **kwargs):
+    """Runs func, returning (result, simulated_seconds, wall_seconds)."""
+    simulated_before = backend.simulated_time
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, backend.simulated_time - simulated_before, time.perf_counter() - started
+
+
+def replay_conversation(chatbot, backend, questions):
+    """Replays questions through ChatbotCore.get_response against the fake backend."""
+    simulated, wall, responses = [], [], []
+    for question in questions:
+        response, simulated_seconds, wall_seconds = _timed(backend, chatbot.get_response, question)
+        responses.append(response)
+        simulated.append(simulated_seconds)
+        wall.append(wall_seconds)
+    report = summarize("get_response", simulated, wall)
+    report["model_calls"] = backend.calls
+    report["injected_failures"] = backend.failures
+    # Failed fallbacks still return a (polite) error message, so count them separately
+    report["fallback_errors"] = chatbot.fallback_errors
+    report["succeeded"] = report["requests"] - chatbot.fallback_errors
+    report["responses"] = responses
+    return report
+
+
+def replay_extraction(backend, institutes, data_schema=UNIVERSITY_DATA_SCHEMA):
+    """Replays generate_info_with_gemini for each institute, retries included."""
+    simulated, wall, succeeded = [], [], 0
+    for institute_name in institutes:
+        data, simulated_seconds, wall_seconds = _timed(
+            backend, generate_info_with_gemini, institute_name, backend, data_schema, retry_delay=0)
+        succeeded += data is not None
+        simulated.append(simulated_seconds)
+        wall.append(wall_seconds)
+    report = summarize("generate_info_with_gemini", simulated, wall)
+    # More calls than institutes means retries ran
+    report["model_calls"] = backend.calls
+    report["injected_failures"] = backend.failures
+    report["succeeded"] = succeeded
+    return report
+
+
+def compare_to_baseline(reports, baseline, tolerance=0.1):
+    """
+    Returns a list of regression messages for deterministic fields that got
+    worse than the baseline by more than `tolerance` (a fraction).
+    """
+    regressions = []
+    for name, report in reports.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        for field, worse in REGRESSION_CHECKS.items():
+            if field not in report or field not in expected:
+                continue
+            current, previous = report[field], expected[field]
+            if worse == "higher" and current > previous * (1 + tolerance):
+                regressions.append(f"{name}.{field}: {current:.2f} > baseline {previous:.2f}")
+            elif worse == "lower" and current < previous * (1 - tolerance):
+                regressions.append(f"{name}.{field}: {current:.2f} < baseline {previous:.2f}")
+    return regressions
+
+
+def run_replays(corpus_path, stream=False, extraction_only=False):
+    """Runs the replays for a corpus and returns {replay name: report}."""
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    reports = {}
+    if not extraction_only:
+        # Imported here so extraction-only replays don't need the NLTK/AIML setup
+        from chatbot_core import ChatbotCore
+
+        backend = FakeModelBackend.from_file(corpus_path, **REPLAY_SETTINGS)
+        chatbot = ChatbotCore(aiml_path='aiml_files', model_backend=backend,
+                              stream_fallback=stream, download_nltk_data=False)
+        reports["get_response"] = replay_conversation(chatbot, backend, corpus.get('conversation', []))
+        chatbot.shutdown()
+
+    backend = FakeModelBackend.from_file(corpus_path, **REPLAY_SETTINGS)
+    reports["generate_info_with_gemini"] = replay_extraction(backend, corpus.get('institutes', []))
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded corpus against a fake model backend.")
+    parser.add_argument("corpus", nargs="?", default=os.path.join('data', 'replay_corpus.json'))
+    parser.add_argument("--stream", action="store_true", help="stream fallback answers through ResponseCleaner")
+    parser.add_argument("--extraction-only", action="store_true", help="skip the get_response replay (no NLTK data needed)")
+    parser.add_argument("--output", help="write the reports to this JSON file (e.g. to record a baseline)")
+    parser.add_argument("--baseline", help="fail if deterministic figures regress against this JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed regression as a fraction (default 0.1)")
+    args = parser.parse_args(argv)
+
+    try:
+        reports = run_replays(args.corpus, stream=args.stream, extraction_only=args.extraction_only)
+    except LookupError as e:
+        logging.error(f"[Replay] NLTK data missing ({e}). Install it once as described in the README, "
+                      f"or run with --extraction-only.")
+        return 2
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        logging.info(f"[Replay] Reports written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(reports, baseline, args.tolerance)
+        for message in regressions:
+            logging.error(f"[Replay] Regression: {message}")
+        if regressions:
+            return 1
+        logging.info("[Replay] No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import re
+import time
+import logging
+
+# Markdown the cleaner understands:
+#   bold-italic  "***text***"
+#   bold         "**text**"
+#   italic       "*text*"  (no whitespace just inside the stars, so "5 * 3 * 2" is left alone)
+#   stray stars  unbalanced "**" runs, a "**text*" run closed with one star ("**KES 1,000*"),
+#                and single stars glued to one side of a word ("*note", "done*") are removed;
+#                stars next to digits or standing alone ("5* rating", " * ") are kept
+#   list marker  "- item", "* item", "+ item", "1. item", "2) item" at the start of a line;
+#                the marker must be followed by whitespace so "1500 KES" is left alone, and
+#                numbers have at most two digits so "2024. Great year" is not a list item
+# All alternatives share the leading "*", factored out so the scan can skip ahead
+# to the next star. Emphasis is removed in one regex scan per block (unmatched
+# groups expand to ""), list markers while the block is split into lines.
+_EMPHASIS_RE = re.compile(
+    r'\*(?:'
+    r'\*\*(.+?)\*\*\*'                 # ***bold-italic***
+    r'|\*(.+?)\*\*?'                   # **bold** (or **bold*)
+    r'|([^\s*](?:.*?[^\s*])?)\*'       # *italic*
+    r'|\*+'                            # unbalanced "**" run
+    r'|(?<=[^\W\d_]\*)(?!\S)'          # stray star closing a word
+    r'|(?<!\S\*)(?=[^\W\d_])'          # stray star opening a word
+    r')'
+)
+_EMPHASIS_REPLACEMENT = r'\1\2\3'
+_LIST_MARKER_RE = re.compile(r'[-*+](?:\s+|$)|\d{1,2}[.)]\s+')
+_LIST_MARKER_START = frozenset("-*+0123456789")
+
+
+class ResponseCleaner:
+    """
+    Incremental markdown-to-plain-text cleaner for Gemini output.
+
+    feed() accepts streamed chunks and returns the cleaned text for every
+    line completed so far; close() flushes the last partial line. Lines are
+    stripped, runs of blank lines collapse to one, and leading/trailing
+    blank lines are dropped.
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._started = False
+        self._pending_blank = False
+
+    def feed(self, chunk):
+        text = self._partial + chunk
+        cut = text.rfind("\n")
+        if cut < 0:
+            self._partial = text
+            return ""
+        self._partial = text[cut + 1:]
+        return self._clean_lines(text[:cut])
+
+    def close(self):
+        output = self._clean_lines(self._partial)
+        self._partial = ""
+        return output
+
+    def _clean_lines(self, text):
+        parts = []
+        if "*" in text:
+            text = _EMPHASIS_RE.sub(_EMPHASIS_REPLACEMENT, text)
+        for line in text.split("\n"):
+            line = line.strip()
+            if line and line[0] in _LIST_MARKER_START:
+                marker = _LIST_MARKER_RE.match(line)
+                if marker:
+                    line = line[marker.end():]
+            if not line:
+                if self._started:
+                    self._pending_blank = True
+                continue
+            if self._started:
+                parts.append("\n\n" if self._pending_blank else "\n")
+            parts.append(line)
+            self._started = True
+            self._pending_blank = False
+        return "".join(parts)
+
+
+def clean_gemini_response_text(text):
+    """Converts a complete Gemini markdown answer to plain text."""
+    cleaner = ResponseCleaner()
+    return cleaner.feed(text) + cleaner.close()
+
+
+def _legacy_clean_gemini_response_text(text):
+    """The original four-pass cleaner, kept only as the benchmark baseline."""
+    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
+    text = re.sub(r'\*(.*?)\*', r'\1', text)
+    text = re.sub(r'^\s*[-*+]?\s*\d*\.?\s*', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    text_lines = [line.strip() for line in text.split('\n')]
+    return '\n'.join(text_lines).strip()
+
+
+def benchmark(iterations=2000):
+    """Times the single-pass cleaner against the legacy one on a typical answer."""
+    sample = (
+        "**JKUAT Fees Overview**\n\n"
+        "Here are the *approximate* annual fees:\n\n"
+        "* **Government sponsored:** KES 16,000 - 70,000\n"
+        "* **Self sponsored:** KES 90,000 - 350,000\n\n\n\n"
+        "1. Apply through the *KUCCPS* portal.\n"
+        "2. Pay the **KES 1,000** application fee.\n"
+        "2024 intake closes in August.\n"
+    ) * 5
+
+    results = {}
+    for name, func in [("legacy", _legacy_clean_gemini_response_text),
+                       ("single_pass", clean_gemini_response_text)]:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func(sample)
+        results[name] = (time.perf_counter() - started) / iterations * 1e6
+        logging.info(f"{name}: {results[name]:.1f} us per response")
+    return results
+
+
+def self_check():
+    """Asserts the cleaner's grammar on a few known cases; run before benchmarking."""
+    cases = {
+        "**Fees**": "Fees",
+        "*approximate*": "approximate",
+        "***both***": "both",
+        "**KES 1,000*": "KES 1,000",
+        "5 * 3 * 2": "5 * 3 * 2",
+        "Price is 5* rating": "Price is 5* rating",
+        "see *note": "see note",
+        "all done* today": "all done today",
+        "**a** and **b**": "a and b",
+        "1500 KES is the fee": "1500 KES is the fee",
+        "2024 intake closes in August.": "2024 intake closes in August.",
+        "2024. Great year": "2024. Great year",
+        "- item\n* item\n+ item\n1. item\n2) item": "item\nitem\nitem\nitem\nitem",
+        "\n\nfirst\n\n\n\nsecond\n\n": "first\n\nsecond",
+    }
+    for raw, expected in cases.items():
+        cleaned = clean_gemini_response_text(raw)
+        assert cleaned == expected, f"{raw!r} -> {cleaned!r}, expected {expected!r}"
+
+    # Streaming in small chunks must give the same result as cleaning at once
+    sample = "\n".join(cases)
+    for chunk_size in (1, 3, 7, 40):
+        cleaner = ResponseCleaner()
+        streamed = "".join(cleaner.feed(sample[i:i + chunk_size]) for i in range(0, len(sample), chunk_size))
+        streamed += cleaner.close()
+        assert streamed == clean_gemini_response_text(sample), f"chunk size {chunk_size} differs"
+    logging.info("Response cleaner self-check passed.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    self_check()
+    benchmark()
@@ -55,6 +55,14 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ message: message }),
             });
 
+            if (response.status === 429) {
+                // Rate limited or shed under load: show the server's message
+                const data = await response.json();
+                removeTypingIndicator(typingIndicator);
+                addMessage(data.response, 'bot');
+                return;
+            }
+
             if (!response.ok) {
                 // If response is not OK (e.g., 400, 500 error)
                 const errorText = await response.text(); // Get error message from server if any